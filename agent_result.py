@@ -0,0 +1,211 @@
+"""
+Agent Result: エージェントとオーケストレーターの処理結果
+Compact result types - Slotted result objects with a dict-compatible view
+"""
+import json
+from collections.abc import Mapping
+from typing import Dict, Any, List, Optional
+
+
+# to_json() で使うエンコーダー（呼び出しごとに作り直さない）
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class AgentResponse(Mapping):
+    """
+    サブエージェント1件分の応答
+    
+    __slots__ で属性を固定し、インスタンスごとの __dict__ を持たない。
+    従来の辞書と同じく response["agent"] や response.get("error") でも参照できる。
+    """
+    
+    __slots__ = ("agent", "specialty", "response", "status", "error")
+    
+    def __init__(self, agent: str, specialty: str, response: str,
+                 status: str = "success", error: Optional[str] = None):
+        self.agent = agent
+        self.specialty = specialty
+        self.response = response
+        self.status = status
+        self.error = error
+    
+    @property
+    def success(self) -> bool:
+        return self.status == "success"
+    
+    def _keys(self) -> tuple:
+        if self.error is None:
+            return ("agent", "specialty", "response", "success", "status")
+        return ("agent", "specialty", "response", "success", "status", "error")
+    
+    def __getitem__(self, key: str):
+        if key not in self._keys():
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __iter__(self):
+        return iter(self._keys())
+    
+    def __len__(self) -> int:
+        return len(self._keys())
+    
+    def __repr__(self) -> str:
+        return f"AgentResponse(agent={self.agent!r}, status={self.status!r})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONなどに書き出すための辞書を返す"""
+        data = {
+            "agent": self.agent,
+            "specialty": self.specialty,
+            "response": self.response,
+            "status": self.status,
+        }
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AgentResponse":
+        """to_dict() の出力（または従来形式の辞書）から復元する"""
+        status = data.get("status") or ("success" if data.get("success") else "error")
+        return cls(data["agent"], data["specialty"], data["response"], status, data.get("error"))
+
+
+class OrchestratorResult(Mapping):
+    """
+    OrchestratorAgent.process の処理結果
+    
+    エージェント名の一覧や成否は個別の応答から都度計算し、重複して保持しない。
+    従来の辞書と同じキー（"agents_used", "success" など）でも参照できるが、
+    読み取り専用で dict ではないため json.dumps には直接渡せない。保存する場合は
+    to_dict()（従来の辞書に近い形）か to_json() / to_row()（配列形式。高速でコンパクト）を使う。
+    """
+    
+    __slots__ = ("orchestrator", "query", "classification", "individual_responses",
+                 "final_response", "elapsed", "compression")
+    
+    KEYS = ("orchestrator", "query", "classification", "agents_used", "individual_responses",
+            "agent_status", "final_response", "success", "partial", "elapsed", "compression")
+    
+    def __init__(self, orchestrator: str, query: str, classification: Dict[str, Any],
+                 individual_responses: List[AgentResponse], final_response: str,
+                 elapsed: float = 0.0, compression: Optional[Dict[str, Any]] = None):
+        self.orchestrator = orchestrator
+        self.query = query
+        self.classification = classification
+        self.individual_responses = individual_responses
+        self.final_response = final_response
+        self.elapsed = elapsed
+        # 統合前の回答圧縮の統計（削減トークン数・所要時間）。圧縮しなかった場合はNone
+        self.compression = compression
+    
+    @property
+    def agents_used(self) -> List[str]:
+        return [r.agent for r in self.individual_responses]
+    
+    @property
+    def agent_status(self) -> Dict[str, str]:
+        return {r.agent: r.status for r in self.individual_responses}
+    
+    @property
+    def success(self) -> bool:
+        """いずれかのエージェントが回答できていれば成功とする"""
+        return any(r.success for r in self.individual_responses)
+    
+    @property
+    def partial(self) -> bool:
+        """一部のエージェントの回答のみで最終回答を作ったか"""
+        return not all(r.success for r in self.individual_responses)
+    
+    def __getitem__(self, key: str):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __iter__(self):
+        return iter(self.KEYS)
+    
+    def __len__(self) -> int:
+        return len(self.KEYS)
+    
+    def __repr__(self) -> str:
+        return f"OrchestratorResult(query={self.query!r}, agent_status={self.agent_status!r})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        JSONなどに書き出すための辞書を返す
+        
+        個別の応答から計算できる項目（agents_used, success など）は含めない。
+        """
+        return {
+            "orchestrator": self.orchestrator,
+            "query": self.query,
+            "classification": self.classification,
+            "individual_responses": [r.to_dict() for r in self.individual_responses],
+            "final_response": self.final_response,
+            "elapsed": self.elapsed,
+            "compression": self.compression,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OrchestratorResult":
+        """to_dict() の出力（または従来形式の辞書）から復元する"""
+        return cls(
+            data["orchestrator"],
+            data["query"],
+            data["classification"],
+            [AgentResponse.from_dict(r) for r in data["individual_responses"]],
+            data["final_response"],
+            data.get("elapsed", 0.0),
+            data.get("compression"),
+        )
+    
+    def to_row(self) -> List[Any]:
+        """
+        スロットの値をそのまま並べた配列に変換する
+        
+        キー名を持たないため、辞書を組み立てる to_dict() よりも速くコンパクトに書き出せる。
+        個別の応答は [agent, specialty, response, status, error] の配列になる。
+        """
+        return [
+            self.orchestrator,
+            self.query,
+            self.classification,
+            [[r.agent, r.specialty, r.response, r.status, r.error] for r in self.individual_responses],
+            self.final_response,
+            self.elapsed,
+            self.compression,
+        ]
+    
+    @classmethod
+    def from_row(cls, row: List[Any]) -> "OrchestratorResult":
+        """to_row() の出力から復元する"""
+        orchestrator, query, classification, responses, final_response, elapsed, compression = row
+        return cls(orchestrator, query, classification, [AgentResponse(*r) for r in responses],
+                   final_response, elapsed, compression)
+    
+    def to_json(self) -> str:
+        """to_row() の配列形式のコンパクトなJSON文字列に変換する（from_json() で復元する）"""
+        return _JSON_ENCODER.encode(self.to_row())
+    
+    @classmethod
+    def from_json(cls, data: str) -> "OrchestratorResult":
+        """to_json() の出力から復元する"""
+        return cls.from_row(json.loads(data))
+    
+    def to_msgpack(self) -> bytes:
+        """to_row() の配列形式でmsgpackに変換する（msgpackパッケージが必要）"""
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("msgpack形式での出力には msgpack パッケージが必要です: pip install msgpack")
+        return msgpack.packb(self.to_row(), use_bin_type=True)
+    
+    @classmethod
+    def from_msgpack(cls, data: bytes) -> "OrchestratorResult":
+        """to_msgpack() の出力から復元する"""
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("msgpack形式の読み込みには msgpack パッケージが必要です: pip install msgpack")
+        return cls.from_row(msgpack.unpackb(data, raw=False))
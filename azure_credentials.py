@@ -0,0 +1,145 @@
+"""
+Azure Credentials: Entra ID トークンのキャッシュとバックグラウンド更新
+Token provider - Caches Azure AD tokens and refreshes them off the request path
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+# Azure OpenAI Service のトークンスコープ
+DEFAULT_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+class CachedTokenProvider:
+    """
+    Entra ID のアクセストークンをメモリにキャッシュし、期限切れ前に裏で更新する
+    
+    AzureOpenAI / AsyncAzureOpenAI の azure_ad_token_provider にそのまま渡せる。
+    start() で最初のトークンを取得してから更新スレッドを起動するため、
+    リクエスト時はキャッシュを返すだけでトークン取得を待たない。
+    
+    credential には get_token(scope) が .token と .expires_on（UNIX時刻）を持つ
+    オブジェクトを返すもの（azure-identity の各クレデンシャルやテスト用の偽物）を渡す。
+    
+    更新スレッドは最長 poll_interval 秒ごとに clock() で有効期限を確認し直すため、
+    スリープからの復帰などで時刻が飛んでも更新が遅れない（テストでは偽の時計を渡せる）。
+    """
+    
+    def __init__(self, credential, scope: str = DEFAULT_SCOPE,
+                 refresh_margin: float = 300.0, retry_interval: float = 10.0,
+                 poll_interval: float = 60.0, clock: Callable[[], float] = time.time):
+        self.credential = credential
+        self.scope = scope
+        # 有効期限のこの秒数前に更新する（トークンの残り時間が短い場合は残り時間の半分）
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self._token: Optional[str] = None
+        self._expires_on = 0.0
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+    
+    def start(self) -> "CachedTokenProvider":
+        """最初のトークンを取得し、バックグラウンドの更新スレッドを起動する"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="TokenRefresher", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """更新スレッドを停止する"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _refresh(self):
+        """クレデンシャルから新しいトークンを取得してキャッシュを差し替える"""
+        access_token = self.credential.get_token(self.scope)
+        expires_on = float(access_token.expires_on)
+        remaining = expires_on - self.clock()
+        with self._lock:
+            self._token = access_token.token
+            self._expires_on = expires_on
+            # 更新する時刻は取得時に決める（確認のたびに残り時間の半分を取り直すと、いつまでも来ない）
+            self._refresh_at = expires_on - min(self.refresh_margin, remaining / 2)
+    
+    def _seconds_until_refresh(self) -> float:
+        return max(self._refresh_at - self.clock(), 0.0)
+    
+    def _refresh_loop(self):
+        """有効期限が近づくたびにトークンを更新する（失敗時は一定間隔で再試行）"""
+        while not self._stop.wait(min(self._seconds_until_refresh(), self.poll_interval)):
+            if self._seconds_until_refresh() > 0:
+                continue
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"[CachedTokenProvider] トークンの更新に失敗しました: {str(e)}")
+                self._stop.wait(self.retry_interval)
+    
+    def __call__(self) -> str:
+        """
+        キャッシュ済みのトークンを返す
+        
+        バックグラウンドの更新が間に合わずに期限が切れている場合のみ、その場で取得する。
+        """
+        if self._token is None or self._expires_on <= self.clock():
+            with self._refresh_lock:
+                # 同時に期限切れを検知したリクエストのうち1つだけが取得する
+                if self._token is None or self._expires_on <= self.clock():
+                    self._refresh()
+        return self._token
+
+
+# スコープごとに共有するプロバイダー（生成に使ったクレデンシャル生成関数と組で持つ）
+_shared_providers: Dict[str, Tuple[Callable, CachedTokenProvider]] = {}
+_shared_lock = threading.Lock()
+
+
+def _default_credential():
+    """azure-identity の DefaultAzureCredential を生成する"""
+    from azure.identity import DefaultAzureCredential
+    return DefaultAzureCredential()
+
+
+def get_shared_token_provider(credential_factory: Optional[Callable] = None,
+                              scope: str = DEFAULT_SCOPE) -> CachedTokenProvider:
+    """
+    プロセス内で共有するトークンプロバイダーを返す
+    
+    同じプロセスで作られる同期・非同期のクライアントは、スコープごとに1つのキャッシュと
+    更新スレッドを共有する。フォークした子プロセスでは新しく作り直す。
+    
+    Args:
+        credential_factory: クレデンシャルを生成する関数（Noneの場合は DefaultAzureCredential）
+        scope: トークンのスコープ
+    
+    Returns:
+        起動済みの CachedTokenProvider
+    
+    Raises:
+        ValueError: 同じスコープのプロバイダーが別のクレデンシャル生成関数ですでに作られている場合
+    """
+    factory = credential_factory or _default_credential
+    with _shared_lock:
+        shared = _shared_providers.get(scope)
+        if shared is not None and shared[1]._pid == os.getpid():
+            if shared[0] is not factory:
+                raise ValueError(
+                    f"スコープ {scope} のトークンプロバイダーは別のクレデンシャルで作成済みです"
+                )
+            return shared[1]
+        provider = CachedTokenProvider(factory(), scope).start()
+        _shared_providers[scope] = (factory, provider)
+        return provider
@@ -0,0 +1,489 @@
+"""
+Batch Runner: 大規模なオフライン質問コーパスをプロセス並列で処理する
+Sharded batch runner - Splits a JSONL corpus across worker processes
+"""
+import argparse
+import contextlib
+import functools
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+
+MANIFEST_NAME = "manifest.json"
+
+# シャードの境界で改行を数えるときの読み込み単位（バイト）
+COUNT_CHUNK_SIZE = 1 << 20
+
+# 再実行時に処理し直す結果の状態（一部のエージェントのみ成功 / すべて失敗）
+RETRYABLE_STATUSES = {"partial", "failed"}
+
+
+class RateLimiter:
+    """
+    全ワーカープロセスで共有するAPI呼び出しのレート制限
+    
+    共有メモリ上に「次に呼び出してよい時刻」を持ち、各プロセスが
+    ロックを取って枠を予約するため、ワーカー数に関係なく全体のレートが守られる。
+    """
+    
+    def __init__(self, rate: float, context=None):
+        context = context or multiprocessing.get_context()
+        self.interval = 1.0 / rate
+        self._next_slot = context.Value("d", 0.0)
+    
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        次の枠まで待機する
+        
+        Args:
+            timeout: 待ってよい最大秒数。次の枠がそれより先の場合は枠を予約せずに戻る
+        
+        Returns:
+            枠を取得できたか
+        """
+        with self._next_slot.get_lock():
+            now = time.monotonic()
+            slot = max(now, self._next_slot.value)
+            if timeout is not None and slot - now > timeout:
+                return False
+            self._next_slot.value = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+        return True
+
+
+class RateLimitedClient:
+    """chat.completions.create の呼び出しごとにレート制限をかけるクライアントのラッパー"""
+    
+    class Completions:
+        def __init__(self, completions, limiter: RateLimiter):
+            self._completions = completions
+            self._limiter = limiter
+        
+        def create(self, **kwargs):
+            # 締め切りのある呼び出しは、持ち時間内に枠が回ってこなければ枠を使わずに失敗させる
+            # （締め切り後に見捨てられる呼び出しが全体のレート枠を消費しないようにする）
+            timeout = kwargs.get("timeout")
+            started = time.monotonic()
+            if not self._limiter.acquire(timeout):
+                raise TimeoutError(f"{timeout:.1f}秒の持ち時間内にレート制限の枠が空きませんでした")
+            if timeout is not None:
+                kwargs["timeout"] = max(timeout - (time.monotonic() - started), 0.001)
+            return self._completions.create(**kwargs)
+    
+    class Chat:
+        def __init__(self, chat, limiter: RateLimiter):
+            self.completions = RateLimitedClient.Completions(chat.completions, limiter)
+    
+    def __init__(self, client, limiter: RateLimiter):
+        self._client = client
+        self._limiter = limiter
+        self.chat = RateLimitedClient.Chat(client.chat, limiter)
+    
+    def with_options(self, **options) -> "RateLimitedClient":
+        """ラップしているクライアントの with_options を同じレート制限のまま呼び出す"""
+        if not hasattr(self._client, "with_options"):
+            return self
+        return RateLimitedClient(self._client.with_options(**options), self._limiter)
+
+
+def _shard_path(work_dir: str, shard: int, generation: int = 0) -> str:
+    """シャードの出力ファイルのパス（generation が1以上は再試行分の出力）"""
+    if generation == 0:
+        return os.path.join(work_dir, f"shard-{shard:05d}.jsonl")
+    return os.path.join(work_dir, f"shard-{shard:05d}.retry-{generation}.jsonl")
+
+
+def _latest_generation(work_dir: str, shard: int) -> int:
+    """シャードの再試行が何回目まで行われているかを返す（再試行していなければ0）"""
+    generation = 0
+    while os.path.exists(_shard_path(work_dir, shard, generation + 1)):
+        generation += 1
+    return generation
+
+
+def _load_checkpoint(path: str) -> int:
+    """
+    シャードの出力ファイルから完了済みの件数を数える
+    
+    クラッシュで途中まで書かれた最終行は切り捨てる。
+    
+    Returns:
+        完了済みの件数
+    """
+    if not os.path.exists(path):
+        return 0
+    
+    completed = 0
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            completed += 1
+            valid_bytes += len(line)
+    
+    if valid_bytes != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return completed
+
+
+def plan_shards(input_path: str, num_shards: int) -> List[List[int]]:
+    """
+    入力コーパスを行の先頭でそろえたバイト範囲に分割する
+    
+    各ワーカーは自分の範囲だけを読むため、コーパス全体を読むのはこの1回だけになる
+    （改行を数えるだけで、デコードはしない）。
+    
+    Returns:
+        シャードごとの [開始バイト, 終了バイト, 先頭行の行番号] のリスト
+    """
+    size = os.path.getsize(input_path)
+    with open(input_path, "rb") as f:
+        boundaries = [0]
+        for shard in range(1, num_shards):
+            target = size * shard // num_shards
+            if target <= boundaries[-1]:
+                boundaries.append(boundaries[-1])
+                continue
+            # target を含む行の次の行の先頭に合わせる
+            f.seek(target - 1)
+            f.readline()
+            boundaries.append(f.tell())
+        boundaries.append(size)
+        
+        # 各境界より前の行数を数え、シャードの先頭行の行番号にする
+        f.seek(0)
+        position = 0
+        lines = 0
+        first_indexes = []
+        for boundary in boundaries[:-1]:
+            while position < boundary:
+                chunk = f.read(min(COUNT_CHUNK_SIZE, boundary - position))
+                lines += chunk.count(b"\n")
+                position += len(chunk)
+            first_indexes.append(lines)
+    
+    return [[boundaries[shard], boundaries[shard + 1], first_indexes[shard]] for shard in range(num_shards)]
+
+
+def _iter_shard(input_path: str, span: List[int]) -> Iterator[tuple]:
+    """入力コーパスのうち、このシャードのバイト範囲の行だけを返す（パースは呼び出し側で行う）"""
+    start, end, index = span
+    with open(input_path, "rb") as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            if line.strip():
+                yield index, line.decode("utf-8", errors="replace")
+            index += 1
+
+
+def _iter_rows(f, generation: int = 0) -> Iterator[tuple]:
+    """シャードの出力を (入力の行番号, 再試行の世代, 状態, 行) として読む"""
+    for line in f:
+        row = json.loads(line)
+        status = row.get("status") or ("error" if "error" in row else "success")
+        yield row["index"], generation, status, line
+
+
+def _iter_latest_rows(work_dir: str, shard: int, generations: int) -> Iterator[tuple]:
+    """
+    シャードの出力を入力順に読み、同じ行を再試行している場合は最新の結果だけを返す
+    
+    各世代のファイルはそれぞれ入力順に並んでいるため、k-wayマージで済む。
+    
+    Args:
+        generations: 読み込む世代数（0 から generations - 1 まで）
+    """
+    with contextlib.ExitStack() as stack:
+        streams = []
+        for generation in range(generations):
+            path = _shard_path(work_dir, shard, generation)
+            if os.path.exists(path):
+                f = stack.enter_context(open(path, "r", encoding="utf-8"))
+                streams.append(_iter_rows(f, generation))
+        latest = None
+        for item in heapq.merge(*streams, key=lambda item: (item[0], item[1])):
+            if latest is not None and latest[0] != item[0]:
+                yield latest
+            latest = item
+        if latest is not None:
+            yield latest
+
+
+def _iter_pending(input_path: str, work_dir: str, shard: int, span: List[int],
+                  generation: int) -> Iterator[tuple]:
+    """
+    指定した世代で処理する入力行を返す
+    
+    最初の世代はシャードの全行、再試行の世代はそれまでの最新の結果が
+    一部成功・失敗だった行だけを返す。
+    """
+    lines = _iter_shard(input_path, span)
+    if generation == 0:
+        yield from lines
+        return
+    
+    previous = _iter_latest_rows(work_dir, shard, generation)
+    row = next(previous, None)
+    for index, line in lines:
+        while row is not None and row[0] < index:
+            row = next(previous, None)
+        if row is not None and row[0] == index and row[2] in RETRYABLE_STATUSES:
+            yield index, line
+
+
+def _process_line(orchestrator, index: int, line: str) -> Dict[str, Any]:
+    """入力の1行を処理し、出力する行を返す"""
+    # 壊れた行や処理中の例外はその行のエラーとして記録し、チェックポイントを先に進める
+    record = {}
+    try:
+        record = json.loads(line)
+        result = orchestrator.process(record["query"])
+    except Exception as e:
+        record_id = record.get("id") if isinstance(record, dict) else None
+        return {"index": index, "id": record_id, "status": "error",
+                "error": f"{type(e).__name__}: {str(e)}"}
+    
+    if not result.success:
+        status = "failed"
+    elif result.partial:
+        status = "partial"
+    else:
+        status = "success"
+    return {"index": index, "id": record.get("id"), "status": status, "result": result.to_dict()}
+
+
+def _run_generation(orchestrator, input_path: str, work_dir: str, shard: int,
+                    span: List[int], generation: int) -> int:
+    """
+    1つの世代の処理をチェックポイントから再開して最後まで行う
+    
+    Returns:
+        この呼び出しで処理した件数
+    """
+    path = _shard_path(work_dir, shard, generation)
+    skip = _load_checkpoint(path)
+    processed = 0
+    out = None
+    try:
+        for position, (index, line) in enumerate(
+                _iter_pending(input_path, work_dir, shard, span, generation)):
+            if position < skip:
+                continue
+            if out is None:
+                # 再試行する行がなければ空のファイルを作らない
+                out = open(path, "a", encoding="utf-8")
+            out.write(json.dumps(_process_line(orchestrator, index, line), ensure_ascii=False) + "\n")
+            out.flush()
+            processed += 1
+    finally:
+        if out is not None:
+            out.close()
+    return processed
+
+
+def _run_shard(input_path: str, work_dir: str, shard: int, span: List[int],
+               client_factory: Callable, deployment_name: str,
+               limiter: Optional[RateLimiter], deadline: Optional[float], quiet: bool):
+    """
+    ワーカープロセスのエントリーポイント: 1シャード分の質問を処理する
+    
+    前回の実行が途中で止まっていればその続きを処理する。前回の実行が最後まで
+    終わっていた場合は、一部成功・失敗だった行を新しい世代として処理し直す。
+    """
+    from orchestrator_agent import OrchestratorAgent
+    
+    if quiet:
+        # オーケストレーターの進捗表示はワーカーでは捨てる
+        sys.stdout = open(os.devnull, "w")
+    
+    client = client_factory()
+    deployment_name = deployment_name or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
+    if limiter is not None:
+        client = RateLimitedClient(client, limiter)
+    orchestrator = OrchestratorAgent(client, deployment_name, deadline=deadline)
+    
+    generation = _latest_generation(work_dir, shard)
+    if _run_generation(orchestrator, input_path, work_dir, shard, span, generation) == 0:
+        _run_generation(orchestrator, input_path, work_dir, shard, span, generation + 1)
+
+
+def _check_manifest(work_dir: str, input_path: str, num_shards: int) -> List[List[int]]:
+    """
+    再開時に前回と同じ入力・シャード数で実行されているかを確認する
+    
+    初回はシャードの分割を計算してマニフェストに記録し、再開時は記録した分割を使う。
+    
+    Returns:
+        シャードごとの [開始バイト, 終了バイト, 先頭行の行番号] のリスト
+    """
+    settings = {"input": os.path.abspath(input_path), "size": os.path.getsize(input_path),
+                "workers": num_shards}
+    path = os.path.join(work_dir, MANIFEST_NAME)
+    
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if {key: previous.get(key) for key in settings} != settings or "shards" not in previous:
+            raise ValueError(
+                f"作業ディレクトリ {work_dir} は別の設定で実行されています: {previous}。"
+                "同じ入力とワーカー数で再実行するか、別の作業ディレクトリを指定してください。"
+            )
+        return previous["shards"]
+    
+    manifest = dict(settings, shards=plan_shards(input_path, num_shards))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return manifest["shards"]
+
+
+def merge_shards(work_dir: str, num_shards: int, output_path: str) -> Dict[str, int]:
+    """
+    シャードごとの出力を入力順に並べ直して1つのJSONLにまとめる
+    
+    各シャードの出力はすでに入力順に並んでいるため、k-wayマージで済む。
+    再試行した行は最新の結果を使う。
+    
+    Returns:
+        書き出した件数と、そのうち失敗（入力エラーを含む）・一部のみ成功した件数を含む辞書
+    """
+    streams = [_iter_latest_rows(work_dir, shard, _latest_generation(work_dir, shard) + 1)
+               for shard in range(num_shards)]
+    count = 0
+    failed = 0
+    partial = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        for _, _, status, line in heapq.merge(*streams, key=lambda item: item[0]):
+            out.write(line)
+            count += 1
+            failed += status in ("failed", "error")
+            partial += status == "partial"
+    return {"processed": count, "failed": failed, "partial": partial}
+
+
+def run_batch(input_path: str, output_path: str, work_dir: str, workers: int = None,
+              client_factory: Callable = None, deployment_name: str = None,
+              rate: Optional[float] = None, deadline: Optional[float] = None,
+              quiet: bool = True) -> Dict[str, Any]:
+    """
+    JSONLコーパスをワーカープロセスに分割して処理し、結果を入力順にマージする
+    
+    入力は行の先頭でそろえたバイト範囲でワーカーに分割し（分割は作業ディレクトリの
+    マニフェストに記録する）、各ワーカーは自分のクライアントとオーケストレーターを持ち、結果を
+    シャードごとのファイルに1件ずつ追記する。途中で停止しても、同じ引数で
+    再実行すれば完了済みの質問を飛ばして再開する。最後まで終わった後に
+    再実行すると、一部成功・失敗だった質問（"status" が "partial" / "failed" の行）を
+    処理し直す。
+    
+    Args:
+        input_path: 入力JSONL（1行に {"query": ..., "id": ...(任意)}）。
+            壊れた行や query のない行は {"index", "id", "error"} の行として出力する
+        output_path: マージ後の出力JSONLのパス
+        work_dir: シャードごとのチェックポイントを置くディレクトリ
+        workers: ワーカープロセス数（Noneの場合はCPUコア数）
+        client_factory: ワーカー内でクライアントを生成する関数（pickle可能であること）
+        deployment_name: デプロイメント名（Noneの場合は環境変数から取得）
+        rate: 全ワーカー合計のAPI呼び出し上限（回/秒）。Noneの場合は無制限
+        deadline: 1クエリあたりの締め切り秒数（Noneの場合は無制限）。
+            レート制限の枠待ちも締め切りに含まれるため、rate と併用する場合は余裕を持たせる
+        quiet: ワーカーの進捗表示を抑制するか
+    
+    Returns:
+        処理件数・失敗件数・一部のみ成功した件数・所要時間を含む辞書
+    """
+    if client_factory is None:
+        from main import initialize_client
+        client_factory = initialize_client
+    workers = workers or os.cpu_count() or 1
+    
+    os.makedirs(work_dir, exist_ok=True)
+    spans = _check_manifest(work_dir, input_path, workers)
+    
+    context = multiprocessing.get_context()
+    limiter = RateLimiter(rate, context) if rate else None
+    
+    started = time.monotonic()
+    processes = [
+        context.Process(
+            target=_run_shard,
+            args=(input_path, work_dir, shard, spans[shard], client_factory,
+                  deployment_name, limiter, deadline, quiet),
+        )
+        for shard in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    
+    failed = [shard for shard, process in enumerate(processes) if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(
+            f"シャード {failed} の処理に失敗しました。同じ引数で再実行すると続きから再開します。"
+        )
+    
+    merged = merge_shards(work_dir, workers, output_path)
+    return {
+        "processed": merged["processed"],
+        "failed": merged["failed"],
+        "partial": merged["partial"],
+        "workers": workers,
+        "elapsed": time.monotonic() - started,
+    }
+
+
+def main():
+    """コマンドラインから実行する"""
+    parser = argparse.ArgumentParser(description="JSONLの質問コーパスをマルチプロセスで一括処理します")
+    parser.add_argument("input", help="入力JSONL（1行に {\"query\": ...}）")
+    parser.add_argument("output", help="出力JSONL")
+    parser.add_argument("--work-dir", default=None, help="チェックポイントの保存先（既定: <output>.shards）")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（既定: CPUコア数）")
+    parser.add_argument("--rate", type=float, default=None, help="全体のAPI呼び出し上限（回/秒）")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="1クエリあたりの締め切り（秒、既定: 無制限。レート制限の待ち時間も含む）")
+    parser.add_argument("--mock", action="store_true", help="Azure OpenAIの代わりにモッククライアントを使う")
+    parser.add_argument("--replay", default=None, help="記録済みのカセットから応答を再生する（ネットワーク不要）")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="再生時のレイテンシ倍率（0で待ち時間なし）")
+    args = parser.parse_args()
+    
+    client_factory = None
+    if args.mock:
+        from mock_demo import MockClient
+        client_factory = MockClient
+    elif args.replay:
+        from record_replay import ReplayClient
+        client_factory = functools.partial(ReplayClient, args.replay, args.replay_speed)
+    
+    summary = run_batch(
+        args.input,
+        args.output,
+        args.work_dir or f"{args.output}.shards",
+        workers=args.workers,
+        client_factory=client_factory,
+        deployment_name="gpt-4-mock" if args.mock else None,
+        rate=args.rate,
+        deadline=args.deadline,
+    )
+    print(f"[BatchRunner] {summary['processed']}件を{summary['workers']}プロセスで処理しました"
+          f"（失敗 {summary['failed']}件、一部のみ成功 {summary['partial']}件、{summary['elapsed']:.1f}秒）")
+    if summary['failed'] or summary['partial']:
+        print("[BatchRunner] 同じコマンドを再実行すると、失敗・一部のみ成功した質問を処理し直します")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
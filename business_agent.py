@@ -2,7 +2,9 @@
 Sub-Agent 2: ビジネス分析エージェント
 Business Analysis Agent - Handles business and strategy questions
 """
-from typing import Dict, Any
+from typing import Optional
+from agent_result import AgentResponse
+from request_options import create_completion
 
 
 class BusinessAgent:
@@ -20,15 +22,16 @@ class BusinessAgent:
 ビジネス戦略、市場分析、収益モデルに関する質問に答えます。
 実践的なビジネスアドバイスを提供してください。"""
     
-    def process(self, query: str) -> Dict[str, Any]:
+    def process(self, query: str, timeout: Optional[float] = None) -> AgentResponse:
         """
         クエリを処理して応答を返す
         
         Args:
             query: ユーザーからの質問
+            timeout: API呼び出しのタイムアウト秒数（Noneの場合はクライアントの既定値）
             
         Returns:
-            エージェントの応答を含む辞書
+            エージェントの応答
         """
         try:
             messages = [
@@ -36,24 +39,21 @@ class BusinessAgent:
                 {"role": "user", "content": query}
             ]
             
-            response = self.client.chat.completions.create(
+            response = create_completion(
+                self.client,
+                timeout,
                 model=self.deployment_name,
                 messages=messages,
                 temperature=0.7,
                 max_tokens=500
             )
             
-            return {
-                "agent": self.name,
-                "specialty": self.specialty,
-                "response": response.choices[0].message.content,
-                "success": True
-            }
+            return AgentResponse(self.name, self.specialty, response.choices[0].message.content)
         except Exception as e:
-            return {
-                "agent": self.name,
-                "specialty": self.specialty,
-                "response": f"エラーが発生しました: {str(e)}",
-                "success": False,
-                "error": str(e)
-            }
+            return AgentResponse(
+                self.name,
+                self.specialty,
+                f"エラーが発生しました: {str(e)}",
+                status="error",
+                error=str(e)
+            )
@@ -0,0 +1,122 @@
+"""
+Import Benchmark: エントリーポイントの起動時間を計測し、予算超過を検出する
+Import-time benchmark - Uses `python -X importtime` to guard startup cost
+"""
+import os
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+
+# モジュールごとのimport時間の予算（ミリ秒、累積）。
+# 遅いCI環境などでは環境変数 MULTIAGENT_IMPORT_BUDGETS_MS（例: "main=40,orchestrator_agent=120"）で上書きできる
+IMPORT_BUDGETS_MS = {
+    "main": 20.0,
+    "orchestrator_agent": 60.0,
+    "technical_agent": 60.0,
+    "business_agent": 60.0,
+}
+
+# import時点では読み込んではいけない重い依存パッケージ
+FORBIDDEN_AT_IMPORT = {"openai", "dotenv", "httpx", "pydantic", "azure"}
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_budgets() -> Dict[str, float]:
+    """既定の予算に環境変数 MULTIAGENT_IMPORT_BUDGETS_MS の指定を反映して返す"""
+    budgets = dict(IMPORT_BUDGETS_MS)
+    override = os.getenv("MULTIAGENT_IMPORT_BUDGETS_MS", "")
+    for item in filter(None, (part.strip() for part in override.split(","))):
+        module, _, value = item.partition("=")
+        try:
+            budgets[module.strip()] = float(value)
+        except ValueError:
+            raise ValueError(f"MULTIAGENT_IMPORT_BUDGETS_MS の指定が不正です: {item}")
+    return budgets
+
+
+def measure_import(module: str, runs: int = 5) -> Tuple[float, Set[str]]:
+    """
+    新しいインタープリターでモジュールをimportし、累積import時間を計測する
+    
+    ばらつきを抑えるため、複数回計測した最小値を使う。
+    
+    Args:
+        module: 計測するモジュール名
+        runs: 計測回数
+    
+    Returns:
+        (累積import時間[ミリ秒], importされたトップレベルパッケージ名の集合)
+    
+    Raises:
+        RuntimeError: モジュールのimportに失敗した場合
+    """
+    best = None
+    imported: Set[str] = set()
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_DIR, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            messages = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+            reason = messages[-1] if messages else f"終了コード {completed.returncode}"
+            raise RuntimeError(f"{module} のimportに失敗しました: {reason}")
+        cumulative = None
+        for line in completed.stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            _, cumulative_us, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            imported.add(name.split(".")[0])
+            if name == module:
+                cumulative = int(cumulative_us) / 1000.0
+        if cumulative is None:
+            raise RuntimeError(f"{module} のimport時間を取得できませんでした")
+        best = cumulative if best is None else min(best, cumulative)
+    return best, imported
+
+
+def check_import_budgets(budgets: Dict[str, float] = None, runs: int = 5,
+                         enforce_budgets: bool = True) -> List[str]:
+    """
+    各モジュールのimport時間が予算内で、重い依存を読み込んでいないことを確認する
+    
+    Args:
+        budgets: モジュールごとの予算（Noneの場合は load_budgets() の値）
+        runs: 1モジュールあたりの計測回数
+        enforce_budgets: Falseの場合は時間の予算は確認せず、importの成否と重い依存だけを確認する
+    
+    Returns:
+        予算超過などの問題点のリスト（問題がなければ空）
+    """
+    budgets = budgets or load_budgets()
+    errors = []
+    for module, budget in budgets.items():
+        try:
+            elapsed, imported = measure_import(module, runs)
+        except RuntimeError as e:
+            errors.append(str(e))
+            continue
+        print(f"[ImportBenchmark] {module}: {elapsed:.1f}ms（予算 {budget:.1f}ms）")
+        if enforce_budgets and elapsed > budget:
+            errors.append(f"{module} のimportに {elapsed:.1f}ms かかりました（予算 {budget:.1f}ms）")
+        eager = sorted(imported & FORBIDDEN_AT_IMPORT)
+        if eager:
+            errors.append(f"{module} のimport時に重い依存が読み込まれています: {', '.join(eager)}")
+    return errors
+
+
+def main():
+    """予算を超えたモジュールがあれば終了コード1を返す"""
+    errors = check_import_budgets()
+    for error in errors:
+        print(f"✗ {error}")
+    if not errors:
+        print("✓ すべてのモジュールが予算内でimportされました")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,29 +3,52 @@ Multi-Agent Demo - Main Entry Point
 マルチエージェントデモのメインプログラム
 """
 import os
-from dotenv import load_dotenv
-from openai import AzureOpenAI
-from orchestrator_agent import OrchestratorAgent
 
 
-def initialize_client():
-    """Azure OpenAI クライアントを初期化"""
+def initialize_client(async_client: bool = False, credential_factory=None):
+    """
+    Azure OpenAI クライアントを初期化
+    
+    AZURE_OPENAI_USE_ENTRA_ID=true の場合はAPIキーの代わりにEntra IDトークンで認証する。
+    トークンはプロセス内で共有するプロバイダーがキャッシュし、期限切れ前に
+    バックグラウンドで更新するため、同期・非同期どちらのクライアントも
+    リクエスト時にトークン取得を待たない。
+    
+    Args:
+        async_client: Trueの場合は AsyncAzureOpenAI を返す
+        credential_factory: Entra ID のクレデンシャルを生成する関数（Noneの場合は DefaultAzureCredential）。
+            指定した場合は AZURE_OPENAI_USE_ENTRA_ID に関係なくEntra ID認証を使う
+    """
+    # 重い依存パッケージは起動時ではなく実際に使う時点で読み込む
+    from dotenv import load_dotenv
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+    
     load_dotenv()
     
     endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
     api_key = os.getenv("AZURE_OPENAI_API_KEY")
     api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+    use_entra_id = (credential_factory is not None
+                    or os.getenv("AZURE_OPENAI_USE_ENTRA_ID", "").lower() in ("1", "true", "yes"))
     
-    if not endpoint or not api_key:
+    if not endpoint or not (api_key or use_entra_id):
         raise ValueError(
             "環境変数が設定されていません。.envファイルを作成し、"
             "AZURE_OPENAI_ENDPOINTとAZURE_OPENAI_API_KEYを設定してください。"
+            "（Entra ID認証の場合はAZURE_OPENAI_USE_ENTRA_ID=trueを設定してください）"
         )
     
-    client = AzureOpenAI(
+    if use_entra_id:
+        from azure_credentials import get_shared_token_provider
+        credentials = {"azure_ad_token_provider": get_shared_token_provider(credential_factory)}
+    else:
+        credentials = {"api_key": api_key}
+    
+    client_class = AsyncAzureOpenAI if async_client else AzureOpenAI
+    client = client_class(
         azure_endpoint=endpoint,
-        api_key=api_key,
-        api_version=api_version
+        api_version=api_version,
+        **credentials
     )
     
     return client
@@ -47,7 +70,20 @@ def print_result(result):
     print("\n【処理の詳細】")
     print(f"- 質問タイプ: {result['classification'].get('type', 'N/A')}")
     print(f"- 使用されたエージェント: {', '.join(result['agents_used'])}")
-    print(f"- 処理結果: {'成功' if result['success'] else '失敗'}")
+    if not result['success']:
+        outcome = '失敗'
+    elif result['partial']:
+        outcome = '成功（一部のエージェントの回答のみ）'
+    else:
+        outcome = '成功'
+    print(f"- 処理結果: {outcome}")
+    statuses = [f"{name}: {status}" for name, status in result['agent_status'].items()]
+    print(f"- エージェントの状態: {', '.join(statuses)}")
+    print(f"- 処理時間: {result['elapsed']:.1f}秒")
+    if result['compression']:
+        compression = result['compression']
+        print(f"- 統合入力の圧縮: {compression['tokens_saved']}トークン削減"
+              f"（{compression['elapsed_ms']:.1f}ms）")
     
     if len(result['individual_responses']) > 1:
         print("\n【各エージェントの個別回答】")
@@ -63,15 +99,25 @@ def run_demo():
     print("Multi-Agent Demo System with Azure OpenAI")
     print("=" * 80)
     
+    recorder = None
     try:
         # クライアント初期化
         print("\n[システム] Azure OpenAIクライアントを初期化中...")
         client = initialize_client()
+        
+        # 環境変数が設定されていればAPI呼び出しをカセットに記録する
+        cassette_path = os.getenv("MULTIAGENT_RECORD_CASSETTE")
+        if cassette_path:
+            from record_replay import RecordingClient
+            client = recorder = RecordingClient(client, cassette_path)
+            print(f"[システム] API呼び出しを記録します: {cassette_path}")
+        
         deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
         print(f"[システム] デプロイメント名: {deployment_name}")
         
         # オーケストレーター初期化
         print("[システム] オーケストレーターを初期化中...")
+        from orchestrator_agent import OrchestratorAgent
         orchestrator = OrchestratorAgent(client, deployment_name)
         print("[システム] 初期化完了！\n")
         
@@ -127,6 +173,11 @@ def run_demo():
         print("3. requirements.txtから依存関係をインストール")
         return 1
     
+    finally:
+        if recorder is not None:
+            recorder.save()
+            print(f"[システム] 記録を保存しました: {recorder.path}")
+    
     return 0
 
 
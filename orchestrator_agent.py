@@ -3,29 +3,73 @@ Orchestrator Agent: マルチエージェントシステムのオーケストレ
 Coordinates between sub-agents to provide comprehensive answers
 """
 import json
-from typing import Dict, Any, List
-from technical_agent import TechnicalAgent
-from business_agent import BusinessAgent
+import time
+from typing import Dict, Any, List, Optional
+from agent_result import AgentResponse, OrchestratorResult
+from request_options import create_completion
+from response_compression import compress_responses
+
+
+# 全体の締め切りを各ステージに配分する割合（分類 / サブエージェント / 統合）
+STAGE_BUDGET_RATIOS = {
+    "classification": 0.2,
+    "agents": 0.5,
+    "synthesis": 0.3,
+}
+
+
+class _GeneralAnswer:
+    """オーケストレーター自身の回答をサブエージェントと同じインターフェースで扱うためのラッパー"""
+    
+    specialty = "一般的な質問"
+    
+    def __init__(self, orchestrator):
+        self.name = orchestrator.name
+        self.process = orchestrator._answer_general
 
 
 class OrchestratorAgent:
     """複数のサブエージェントを調整するオーケストレーター"""
     
-    def __init__(self, client, deployment_name: str):
+    def __init__(self, client, deployment_name: str, deadline: Optional[float] = 60.0,
+                 synthesis_tokens_per_agent: Optional[int] = 300):
         self.client = client
         self.deployment_name = deployment_name
         self.name = "OrchestratorAgent"
+        # 1クエリあたりの全体の締め切り（秒）。Noneの場合は無制限
+        self.deadline = deadline
+        # 統合プロンプトに入れる各エージェントの回答のトークン上限。Noneの場合は圧縮しない
+        self.synthesis_tokens_per_agent = synthesis_tokens_per_agent
         
-        # サブエージェントの初期化
-        self.technical_agent = TechnicalAgent(client, deployment_name)
-        self.business_agent = BusinessAgent(client, deployment_name)
+        # サブエージェントは最初に使われた時点でモジュールごと読み込む
+        self._technical_agent = None
+        self._business_agent = None
+        # 一般的な質問はオーケストレーター自身が回答する（サブエージェントと同じ形で実行できるようにする）
+        self._general_agent = _GeneralAnswer(self)
     
-    def classify_query(self, query: str) -> Dict[str, Any]:
+    @property
+    def technical_agent(self):
+        """技術エージェント（初回アクセス時に初期化）"""
+        if self._technical_agent is None:
+            from technical_agent import TechnicalAgent
+            self._technical_agent = TechnicalAgent(self.client, self.deployment_name)
+        return self._technical_agent
+    
+    @property
+    def business_agent(self):
+        """ビジネスエージェント（初回アクセス時に初期化）"""
+        if self._business_agent is None:
+            from business_agent import BusinessAgent
+            self._business_agent = BusinessAgent(self.client, self.deployment_name)
+        return self._business_agent
+    
+    def classify_query(self, query: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """
         質問を分類し、どのエージェントが適切かを判断する
         
         Args:
             query: ユーザーからの質問
+            timeout: API呼び出しのタイムアウト秒数
             
         Returns:
             分類結果を含む辞書
@@ -49,7 +93,9 @@ class OrchestratorAgent:
                 {"role": "user", "content": classification_prompt}
             ]
             
-            response = self.client.chat.completions.create(
+            response = create_completion(
+                self.client,
+                timeout,
                 model=self.deployment_name,
                 messages=messages,
                 temperature=0.3,
@@ -76,13 +122,17 @@ class OrchestratorAgent:
         except Exception as e:
             return {"type": "general", "reasoning": f"分類エラー: {str(e)}"}
     
-    def synthesize_responses(self, query: str, responses: List[Dict[str, Any]]) -> str:
+    def synthesize_responses(self, query: str, responses: List[Dict[str, Any]],
+                             timeout: Optional[float] = None,
+                             contents: Optional[List[str]] = None) -> str:
         """
         複数のエージェントからの応答を統合する
         
         Args:
             query: 元の質問
             responses: 各エージェントからの応答リスト
+            timeout: API呼び出しのタイムアウト秒数
+            contents: 統合プロンプトに入れる回答（圧縮済み）。Noneの場合は各応答をそのまま使う
             
         Returns:
             統合された応答
@@ -98,8 +148,10 @@ class OrchestratorAgent:
 
 専門家の回答:
 """
-        for resp in responses:
-            synthesis_prompt += f"\n[{resp['agent']} - {resp['specialty']}]\n{resp['response']}\n"
+        if contents is None:
+            contents = [resp["response"] for resp in responses]
+        for resp, content in zip(responses, contents):
+            synthesis_prompt += f"\n[{resp['agent']} - {resp['specialty']}]\n{content}\n"
         
         synthesis_prompt += "\n上記の専門家の意見を踏まえて、統合された包括的な回答を提供してください。"
         
@@ -109,7 +161,9 @@ class OrchestratorAgent:
                 {"role": "user", "content": synthesis_prompt}
             ]
             
-            response = self.client.chat.completions.create(
+            response = create_completion(
+                self.client,
+                timeout,
                 model=self.deployment_name,
                 messages=messages,
                 temperature=0.7,
@@ -119,88 +173,170 @@ class OrchestratorAgent:
             return response.choices[0].message.content
         except Exception as e:
             # エラー時は単純に結合
-            combined = "\n\n".join([f"【{r['agent']}の回答】\n{r['response']}" for r in responses])
-            return combined
+            return self._combine_responses(responses)
+    
+    @staticmethod
+    def _combine_responses(responses: List[Dict[str, Any]]) -> str:
+        """LLMを使わずに各エージェントの応答をそのまま並べる"""
+        if len(responses) == 1:
+            return responses[0]["response"]
+        return "\n\n".join([f"【{r['agent']}の回答】\n{r['response']}" for r in responses])
+    
+    def _stage_budget(self, stage: str, started: float, deadline: Optional[float]) -> Optional[float]:
+        """
+        残り時間をこれから実行するステージの割合で按分し、このステージの持ち時間を返す
+        
+        前のステージで余った時間は後続のステージに繰り越される。
+        """
+        if deadline is None:
+            return None
+        stages = list(STAGE_BUDGET_RATIOS)
+        remaining_ratio = sum(STAGE_BUDGET_RATIOS[s] for s in stages[stages.index(stage):])
+        remaining = max(deadline - (time.monotonic() - started), 0.0)
+        return remaining * STAGE_BUDGET_RATIOS[stage] / remaining_ratio
+    
+    def _answer_general(self, query: str, timeout: Optional[float] = None) -> AgentResponse:
+        """一般的な質問にオーケストレーター自身が回答する"""
+        try:
+            messages = [
+                {"role": "system", "content": "あなたは親切なアシスタントです。"},
+                {"role": "user", "content": query}
+            ]
+            
+            response = create_completion(
+                self.client,
+                timeout,
+                model=self.deployment_name,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=500
+            )
+            
+            return AgentResponse(self.name, _GeneralAnswer.specialty, response.choices[0].message.content)
+        except Exception as e:
+            return AgentResponse(
+                self.name,
+                _GeneralAnswer.specialty,
+                f"エラーが発生しました: {str(e)}",
+                status="error",
+                error=str(e)
+            )
+    
+    def _run_agents(self, query: str, agents: List[Any], budget: Optional[float]) -> List[AgentResponse]:
+        """
+        サブエージェントを並行実行し、持ち時間内に終わった応答を集める
+        
+        持ち時間を過ぎても終わらないエージェントはキャンセル扱いとし、
+        status="timeout" の応答を返す。
+        
+        Args:
+            query: ユーザーからの質問
+            agents: 実行するエージェント（name, specialty, processを持つオブジェクト）のリスト
+            budget: このステージの持ち時間（秒）
+            
+        Returns:
+            エージェントの順序どおりに並んだ応答のリスト
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait
+        
+        executor = ThreadPoolExecutor(max_workers=len(agents))
+        try:
+            futures = [executor.submit(agent.process, query, budget) for agent in agents]
+            wait(futures, timeout=budget)
+            
+            responses = []
+            for agent, future in zip(agents, futures):
+                if future.done():
+                    responses.append(future.result())
+                else:
+                    future.cancel()
+                    print(f"[{self.name}] {agent.name}が締め切りまでに応答しませんでした")
+                    responses.append(AgentResponse(
+                        agent.name,
+                        agent.specialty,
+                        "締め切りまでに応答がありませんでした",
+                        status="timeout",
+                        error=f"{budget:.1f}秒の持ち時間を超過しました"
+                    ))
+            return responses
+        finally:
+            # 実行中のスレッドの終了は待たない（未着手のものは上でキャンセル済み。実行中のものはAPI側のタイムアウトで終了する）
+            executor.shutdown(wait=False)
     
-    def process(self, query: str) -> Dict[str, Any]:
+    def process(self, query: str, deadline: Optional[float] = None) -> OrchestratorResult:
         """
         質問を処理し、適切なサブエージェントに振り分けて回答を生成する
         
+        全体の締め切りを分類・サブエージェント・統合の各ステージに配分し、
+        締め切りに間に合わなかったエージェントを除いた応答から最終回答を作る。
+        
         Args:
             query: ユーザーからの質問
+            deadline: 全体の締め切り秒数（Noneの場合はインスタンスの既定値）
             
         Returns:
-            処理結果を含む辞書
+            処理結果（従来の辞書と同じキーでも参照できる）
         """
+        started = time.monotonic()
+        if deadline is None:
+            deadline = self.deadline
+        
         print(f"\n[{self.name}] 質問を分析中...")
         
         # 質問を分類
-        classification = self.classify_query(query)
+        classification = self.classify_query(
+            query, timeout=self._stage_budget("classification", started, deadline)
+        )
         query_type = classification.get("type", "general")
         
         print(f"[{self.name}] 質問タイプ: {query_type}")
         print(f"[{self.name}] 判断理由: {classification.get('reasoning', 'N/A')}")
         
         # エージェントに振り分け
-        responses = []
-        
+        budget = self._stage_budget("agents", started, deadline)
         if query_type == "technical":
             print(f"\n[{self.name}] {self.technical_agent.name}に質問を転送...")
-            response = self.technical_agent.process(query)
-            responses.append(response)
+            responses = self._run_agents(query, [self.technical_agent], budget)
             
         elif query_type == "business":
             print(f"\n[{self.name}] {self.business_agent.name}に質問を転送...")
-            response = self.business_agent.process(query)
-            responses.append(response)
+            responses = self._run_agents(query, [self.business_agent], budget)
             
         elif query_type == "both":
             print(f"\n[{self.name}] 両方のエージェントに質問を転送...")
-            tech_response = self.technical_agent.process(query)
-            business_response = self.business_agent.process(query)
-            responses.extend([tech_response, business_response])
+            responses = self._run_agents(query, [self.technical_agent, self.business_agent], budget)
             
         else:  # general
             print(f"\n[{self.name}] 一般的な質問として処理...")
             # オーケストレーター自身が回答
-            try:
-                messages = [
-                    {"role": "system", "content": "あなたは親切なアシスタントです。"},
-                    {"role": "user", "content": query}
-                ]
-                
-                response = self.client.chat.completions.create(
-                    model=self.deployment_name,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=500
-                )
-                
-                responses.append({
-                    "agent": self.name,
-                    "specialty": "一般的な質問",
-                    "response": response.choices[0].message.content,
-                    "success": True
-                })
-            except Exception as e:
-                responses.append({
-                    "agent": self.name,
-                    "specialty": "一般的な質問",
-                    "response": f"エラーが発生しました: {str(e)}",
-                    "success": False,
-                    "error": str(e)
-                })
-        
-        # 応答を統合
-        print(f"\n[{self.name}] 応答を統合中...")
-        final_response = self.synthesize_responses(query, responses)
-        
-        return {
-            "orchestrator": self.name,
-            "query": query,
-            "classification": classification,
-            "agents_used": [r["agent"] for r in responses],
-            "individual_responses": responses,
-            "final_response": final_response,
-            "success": all(r.get("success", False) for r in responses)
-        }
+            responses = self._run_agents(query, [self._general_agent], budget)
+        
+        # 応答を統合（成功した応答のみ）
+        usable = [r for r in responses if r.success]
+        compression = None
+        if not usable:
+            # 全て失敗した場合はエラー内容を統合用のLLMに渡さず、そのまま並べる
+            print(f"\n[{self.name}] 全てのエージェントが失敗したため、統合を省略します")
+            final_response = self._combine_responses(responses)
+        else:
+            print(f"\n[{self.name}] 応答を統合中...")
+            # 統合の前に、重複する文を除き各回答をトークン上限まで圧縮する（LLMは呼ばない）
+            contents = None
+            if len(usable) > 1 and self.synthesis_tokens_per_agent is not None:
+                contents, compression = compress_responses(usable, self.synthesis_tokens_per_agent, query)
+                print(f"[{self.name}] 統合入力を圧縮: {compression['tokens_before']} → "
+                      f"{compression['tokens_after']}トークン（{compression['elapsed_ms']:.1f}ms）")
+            
+            final_response = self.synthesize_responses(
+                query, usable, timeout=self._stage_budget("synthesis", started, deadline), contents=contents
+            )
+        
+        return OrchestratorResult(
+            self.name,
+            query,
+            classification,
+            responses,
+            final_response,
+            elapsed=time.monotonic() - started,
+            compression=compression
+        )
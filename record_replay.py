@@ -0,0 +1,270 @@
+"""
+Record/Replay: 実際のAPI呼び出しを記録し、ネットワークなしで再生する
+Record/replay clients - Capture real chat.completions traffic into a cassette
+"""
+import copy
+import builtins
+import gzip
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional
+
+
+CASSETTE_VERSION = 1
+
+# リクエストの同一性の判定に含めないパラメータ（呼び出しごとに変わりうる値）
+IGNORED_REQUEST_KEYS = {"timeout"}
+
+
+def _json_default(value: Any) -> Any:
+    """
+    JSONにできない引数（response_format のモデルやツールのオブジェクトなど）を変換する
+    
+    pydantic のモデルはスキーマや値に、それ以外は repr にする。
+    """
+    if isinstance(value, type) and hasattr(value, "model_json_schema"):
+        return value.model_json_schema()
+    if hasattr(value, "model_dump") and not isinstance(value, type):
+        return value.model_dump()
+    return repr(value)
+
+
+def request_hash(request: Dict[str, Any]) -> str:
+    """
+    chat.completions.create の引数からリクエストのハッシュを計算する
+    
+    Args:
+        request: create に渡されたキーワード引数
+    
+    Returns:
+        16桁の16進文字列
+    """
+    canonical = {k: v for k, v in request.items() if k not in IGNORED_REQUEST_KEYS}
+    payload = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+                         default=_json_default)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_cassette(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """カセットファイルを読み込み、リクエストハッシュから記録へのインデックスを返す"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != CASSETTE_VERSION:
+        raise ValueError(f"対応していないカセットのバージョンです: {data.get('version')}")
+    return data["interactions"]
+
+
+def save_cassette(path: str, interactions: Dict[str, List[Dict[str, Any]]]):
+    """リクエストハッシュごとの記録をgzip圧縮したJSONとして保存する"""
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump({"version": CASSETTE_VERSION, "interactions": interactions},
+                  f, ensure_ascii=False, separators=(",", ":"))
+
+
+class RecordedAPIError(Exception):
+    """
+    記録時に発生したAPIエラーを再生するための例外
+    
+    openai の例外（RateLimitError など）はHTTP応答なしには再構築できないため、
+    元の例外の型名・ステータスコード・メッセージを保持して送出する。
+    """
+    
+    def __init__(self, error_type: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+        self.status_code = status_code
+        self.message = message
+
+
+def _recorded_exception(error: Dict[str, Any]) -> Exception:
+    """記録されたエラーから送出する例外を作る（組み込み例外は同じ型で再現する）"""
+    if error.get("module") == "builtins":
+        error_class = getattr(builtins, error["type"], None)
+        if isinstance(error_class, type) and issubclass(error_class, Exception):
+            return error_class(error["message"])
+    return RecordedAPIError(error["type"], error["message"], error.get("status_code"))
+
+
+class ReplayUsage:
+    """記録されたトークン使用量"""
+    
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+
+class ReplayMessage:
+    """記録されたメッセージ"""
+    
+    def __init__(self, content: str):
+        self.role = "assistant"
+        self.content = content
+
+
+class ReplayChoice:
+    """記録された選択肢"""
+    
+    def __init__(self, content: str, finish_reason: Optional[str]):
+        self.message = ReplayMessage(content)
+        self.finish_reason = finish_reason
+
+
+class ReplayResponse:
+    """記録された chat.completions.create の応答"""
+    
+    def __init__(self, interaction: Dict[str, Any]):
+        self.model = interaction.get("model")
+        self.choices = [ReplayChoice(interaction["content"], interaction.get("finish_reason"))]
+        usage = interaction.get("usage")
+        self.usage = ReplayUsage(*usage) if usage else None
+
+
+class RecordingClient:
+    """
+    実際のクライアントをラップし、chat.completions.create の呼び出しを記録する
+    
+    記録はリクエストハッシュごとに呼び出し順で保持し、save() でカセットに書き出す。
+    with 文で使うと終了時に自動的に保存する。
+    """
+    
+    class Completions:
+        def __init__(self, recorder: "RecordingClient", completions):
+            self._recorder = recorder
+            self._completions = completions
+        
+        def create(self, **kwargs):
+            started = time.monotonic()
+            try:
+                response = self._completions.create(**kwargs)
+            except Exception as e:
+                # 429や5xx、タイムアウトなども再生できるように記録してから送出し直す
+                self._recorder._safely(self._recorder._record_error, kwargs, e, time.monotonic() - started)
+                raise
+            latency = time.monotonic() - started
+            self._recorder._safely(self._recorder._record, kwargs, response, latency)
+            return response
+    
+    class Chat:
+        def __init__(self, recorder: "RecordingClient", chat):
+            self.completions = RecordingClient.Completions(recorder, chat.completions)
+    
+    def __init__(self, client, path: str):
+        self.path = path
+        self._client = client
+        self.chat = RecordingClient.Chat(self, client.chat)
+        self.interactions: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+    
+    def with_options(self, **options) -> "RecordingClient":
+        """ラップしているクライアントの with_options を呼び出す（記録先は共有する）"""
+        if not hasattr(self._client, "with_options"):
+            return self
+        clone = copy.copy(self)
+        clone._client = self._client.with_options(**options)
+        clone.chat = RecordingClient.Chat(clone, clone._client.chat)
+        return clone
+    
+    def _safely(self, record: Callable, *args):
+        """記録に失敗しても呼び出し元には影響させない（その呼び出しは記録されない）"""
+        try:
+            record(*args)
+        except Exception as e:
+            print(f"[RecordingClient] 呼び出しを記録できませんでした: {type(e).__name__}: {str(e)}")
+    
+    def _record(self, request: Dict[str, Any], response, latency: float):
+        """1回分のリクエストと応答を記録する"""
+        choice = response.choices[0]
+        usage = getattr(response, "usage", None)
+        interaction = {
+            "model": getattr(response, "model", request.get("model")),
+            "content": choice.message.content,
+            "finish_reason": getattr(choice, "finish_reason", None),
+            "usage": [usage.prompt_tokens, usage.completion_tokens] if usage else None,
+            "latency": round(latency, 4),
+        }
+        self._append(request, interaction)
+    
+    def _record_error(self, request: Dict[str, Any], error: Exception, latency: float):
+        """失敗した呼び出しの例外の種類・メッセージ・レイテンシを記録する"""
+        interaction = {
+            "error": {
+                "type": type(error).__name__,
+                "module": type(error).__module__,
+                "message": str(error),
+                "status_code": getattr(error, "status_code", None),
+            },
+            "latency": round(latency, 4),
+        }
+        self._append(request, interaction)
+    
+    def _append(self, request: Dict[str, Any], interaction: Dict[str, Any]):
+        key = request_hash(request)
+        with self._lock:
+            self.interactions.setdefault(key, []).append(interaction)
+    
+    def save(self):
+        """記録をカセットファイルに書き出す"""
+        with self._lock:
+            save_cassette(self.path, self.interactions)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.save()
+
+
+class ReplayClient:
+    """
+    カセットに記録された応答をリクエストハッシュで引いて返すクライアント
+    
+    同じリクエストが複数回記録されている場合は記録順に返し、使い切ったら先頭に戻る。
+    記録時に失敗した呼び出しは、同じレイテンシの後に記録された例外を送出する。
+    応答までの待ち時間は記録時のレイテンシに latency_scale を掛けた値になる
+    （0を指定すると待たずに返す）。
+    """
+    
+    class Completions:
+        def __init__(self, replayer: "ReplayClient"):
+            self._replayer = replayer
+        
+        def create(self, **kwargs):
+            return self._replayer._replay(kwargs)
+    
+    class Chat:
+        def __init__(self, replayer: "ReplayClient"):
+            self.completions = ReplayClient.Completions(replayer)
+    
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.interactions = load_cassette(path)
+        self.chat = ReplayClient.Chat(self)
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def _replay(self, request: Dict[str, Any]) -> ReplayResponse:
+        """記録から応答（またはエラー）を取り出し、記録時のレイテンシを再現して返す"""
+        key = request_hash(request)
+        recorded = self.interactions.get(key)
+        if not recorded:
+            raise KeyError(f"カセットに記録されていないリクエストです: {key}")
+        
+        with self._lock:
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = (cursor + 1) % len(recorded)
+        interaction = recorded[cursor]
+        
+        delay = interaction["latency"] * self.latency_scale
+        timeout = request.get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"{timeout:.1f}秒以内に応答がありませんでした（再生時のレイテンシ: {delay:.1f}秒）")
+        if delay > 0:
+            time.sleep(delay)
+        if "error" in interaction:
+            raise _recorded_exception(interaction["error"])
+        return ReplayResponse(interaction)
@@ -0,0 +1,77 @@
+"""
+Request Options: chat.completions.create に渡す共通オプション
+Shared request options - Per-call timeout and deadline-aware retries used by every agent
+"""
+import random
+import time
+from typing import Dict, Any, Optional
+
+
+# SDKの既定と同じく、429・5xx・接続エラーなどは最大2回まで再試行する
+MAX_RETRIES = 2
+
+# 再試行までの待ち時間（秒）。1回目は INITIAL_RETRY_DELAY、以降は倍にして MAX_RETRY_DELAY まで
+INITIAL_RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 8.0
+
+# 再試行する HTTP ステータスコード（5xx はすべて再試行する）
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+def request_options(timeout: Optional[float]) -> Dict[str, Any]:
+    """
+    タイムアウトが指定されている場合のみAPI呼び出しのオプションに含める
+    
+    持ち時間を使い切っている場合でも0秒（無制限と解釈されうる値）にならないよう、
+    下限を設ける。
+    """
+    if timeout is None:
+        return {}
+    return {"timeout": max(timeout, 0.001)}
+
+
+def _is_retryable(error: Exception) -> bool:
+    """SDKが自動で再試行するのと同じ種類のエラーか（openai を import せずに判定する）"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # openai.APIConnectionError（APITimeoutError を含む）
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+
+def create_completion(client, timeout: Optional[float], **kwargs):
+    """
+    chat.completions.create を呼び出す
+    
+    締め切りがない場合はSDKの自動リトライにそのまま任せる。締め切りがある場合は
+    SDKの自動リトライ（各回が timeout まで待つ）を無効にし、持ち時間の残りの中で
+    再試行する。待ち時間の後に持ち時間が残らない場合は、再試行せずにエラーを送出する。
+    
+    Args:
+        client: AzureOpenAI などのクライアント
+        timeout: この呼び出しに使える持ち時間（秒）。Noneの場合は無制限
+        **kwargs: create に渡す引数
+    
+    Returns:
+        create の応答
+    """
+    if timeout is None:
+        return client.chat.completions.create(**kwargs)
+    
+    if hasattr(client, "with_options"):
+        client = client.with_options(max_retries=0)
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        try:
+            return client.chat.completions.create(
+                **kwargs, **request_options(deadline - time.monotonic())
+            )
+        except Exception as e:
+            delay = min(INITIAL_RETRY_DELAY * 2 ** attempt, MAX_RETRY_DELAY) * random.uniform(0.75, 1.0)
+            if attempt >= MAX_RETRIES or not _is_retryable(e) or time.monotonic() + delay >= deadline:
+                raise
+            attempt += 1
+            time.sleep(delay)
@@ -0,0 +1,182 @@
+"""
+Response Compression: 統合前にサブエージェントの回答を圧縮する
+Pre-synthesis reduction - Dedupe, key-point extraction and per-agent token caps
+"""
+import re
+import time
+from typing import Dict, Any, List, Mapping, Optional, Set, Tuple
+
+
+# 1行の中での文の区切り（日本語の句点・感嘆符・疑問符、英語の文末）。改行では常に区切る
+SENTENCE_BOUNDARY = re.compile(r"(?<=[。！？!?])|(?<=\.)\s+")
+
+# ピリオドで終わっても文末とみなさない略語
+ABBREVIATIONS = {"dr.", "mr.", "mrs.", "ms.", "prof.", "st.", "no.", "vs.", "etc.", "e.g.", "i.e.", "fig."}
+
+# 重複判定の前に取り除く空白・記号
+NORMALIZE_PATTERN = re.compile(r"[\s、。，,.!！?？「」『』（）()\[\]【】・:：\-*#>|]+")
+
+# 箇条書きや番号付きの行（要点である可能性が高い）
+BULLET_PATTERN = re.compile(r"^\s*([-*・•]|\d+[.)．、])\s*")
+
+# 全角文字（かな・漢字・全角記号など）
+CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+# 重複とみなす類似度のしきい値（新しい文の語句のうち、採用済みの文と共通する割合）
+DUPLICATE_THRESHOLD = 0.8
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数を概算する
+    
+    日本語などの全角文字は1文字1トークン、それ以外は4文字1トークンとして数える。
+    """
+    cjk = len(CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    回答を文（または箇条書きの行）に分割する
+    
+    改行で行に分けてから、各行の中を文末で区切る。行頭の箇条書き記号や番号
+    （「1.」など）と略語（「Dr.」など）は、後に続く文と切り離さない。
+    """
+    sentences = []
+    for line in text.split("\n"):
+        marker = BULLET_PATTERN.match(line)
+        prefix = marker.group(0) if marker else ""
+        pieces: List[str] = []
+        for piece in SENTENCE_BOUNDARY.split(line[len(prefix):]):
+            piece = piece.strip()
+            if not piece:
+                continue
+            if pieces and pieces[-1].split()[-1].lower() in ABBREVIATIONS:
+                pieces[-1] += " " + piece
+            else:
+                pieces.append(piece)
+        if pieces:
+            pieces[0] = (prefix + pieces[0]).strip()
+        elif prefix.strip():
+            pieces.append(prefix.strip())
+        sentences.extend(pieces)
+    return sentences
+
+
+def _bigrams(text: str) -> Set[str]:
+    normalized = NORMALIZE_PATTERN.sub("", text).lower()
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+def _is_duplicate(bigrams: Set[str], seen: List[Set[str]]) -> bool:
+    """すでに採用した文とほぼ同じ内容か（採用済みの文に含まれる場合も含む）"""
+    for other in seen:
+        if len(bigrams & other) / len(bigrams) >= DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    """トークン予算に収まるように末尾を切り詰める"""
+    budget = max(budget - 1, 0)  # 末尾の「…」の分
+    while text and estimate_tokens(text) > budget:
+        text = text[:max(len(text) - max(len(text) // 10, 1), 0)]
+    return text + "…" if text else text
+
+
+def compress_responses(responses: List[Mapping[str, Any]], tokens_per_agent: int,
+                       query: Optional[str] = None) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    統合プロンプトに入れる前に、各エージェントの回答を圧縮する
+    
+    1. 回答を文に分割し、エージェント間・エージェント内で重複する文を取り除く
+    2. 回答全体で繰り返し現れる語句・質問との関連・箇条書きかどうかで文に点数を付ける
+    3. 点数の高い文から、エージェントごとのトークン予算に収まるだけ元の順序で残す
+    
+    LLMは呼ばず、ローカルの文字列処理だけで行う。
+    
+    Args:
+        responses: 各エージェントの応答（"response" キーを持つ）
+        tokens_per_agent: エージェント1件あたりのトークン予算
+        query: 元の質問（関連度の計算に使う）
+    
+    Returns:
+        (圧縮後の回答テキストのリスト, 削減トークン数と所要時間を含む統計情報)
+    """
+    started = time.perf_counter()
+    
+    # 1. 文に分割し、重複を取り除く
+    seen: List[Set[str]] = []
+    candidates: List[List[Tuple[int, str, Set[str]]]] = []
+    sentence_counts: List[int] = []
+    for resp in responses:
+        kept = []
+        count = 0
+        for position, sentence in enumerate(split_sentences(resp["response"])):
+            bigrams = _bigrams(sentence)
+            if not bigrams:
+                # 記号や番号だけの断片は文として数えない
+                continue
+            count += 1
+            if _is_duplicate(bigrams, seen):
+                continue
+            seen.append(bigrams)
+            kept.append((position, sentence, bigrams))
+        candidates.append(kept)
+        sentence_counts.append(count)
+    
+    # 2. 回答全体での語句の出現頻度から文の重要度を計算する
+    frequency: Dict[str, int] = {}
+    for bigrams in seen:
+        for bigram in bigrams:
+            frequency[bigram] = frequency.get(bigram, 0) + 1
+    query_bigrams = _bigrams(query) if query else set()
+    
+    def score(position: int, sentence: str, bigrams: Set[str]) -> float:
+        value = sum(frequency[b] for b in bigrams) / len(bigrams)
+        if query_bigrams:
+            value += 2.0 * len(bigrams & query_bigrams) / len(query_bigrams)
+        if position == 0:
+            value += 1.0
+        if BULLET_PATTERN.match(sentence):
+            value += 0.5
+        return value
+    
+    # 3. エージェントごとに予算内で重要な文を残す
+    contents = []
+    sentences_kept = 0
+    for resp, kept, count in zip(responses, candidates, sentence_counts):
+        original = resp["response"]
+        if len(kept) == count and estimate_tokens(original) <= tokens_per_agent:
+            # 削る必要がなければ元の回答をそのまま使う
+            contents.append(original)
+            sentences_kept += len(kept)
+            continue
+        
+        ranked = sorted(kept, key=lambda item: score(*item), reverse=True)
+        selected = []
+        used = 0
+        for item in ranked:
+            cost = estimate_tokens(item[1])
+            if used + cost <= tokens_per_agent:
+                selected.append(item)
+                used += cost
+        if not selected and ranked:
+            selected = [(ranked[0][0], _truncate_to_tokens(ranked[0][1], tokens_per_agent), ranked[0][2])]
+        
+        selected.sort(key=lambda item: item[0])
+        sentences_kept += len(selected)
+        contents.append("\n".join(sentence for _, sentence, _ in selected))
+    
+    tokens_before = sum(estimate_tokens(resp["response"]) for resp in responses)
+    tokens_after = sum(estimate_tokens(content) for content in contents)
+    stats = {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "sentences_removed": sum(sentence_counts) - sentences_kept,
+        "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+    }
+    return contents, stats
@@ -0,0 +1,117 @@
+"""
+Result Benchmark: 処理結果のメモリ使用量とシリアライズ時間を計測する
+Result benchmark - Compares slotted results with the previous plain-dict results
+"""
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, Any, Callable, List
+
+from agent_result import AgentResponse, OrchestratorResult
+
+
+def _sample_result(i: int) -> OrchestratorResult:
+    """技術・ビジネスの両エージェントが回答した典型的な結果を作る"""
+    responses = [
+        AgentResponse("TechnicalAgent", "技術仕様・実装・アーキテクチャ", "技術的な回答です。" * 20),
+        AgentResponse("BusinessAgent", "ビジネス戦略・市場分析・収益モデル", "ビジネス的な回答です。" * 20),
+    ]
+    return OrchestratorResult(
+        "OrchestratorAgent",
+        f"質問{i}: AIエージェントの技術とビジネス活用について",
+        {"type": "both", "reasoning": "技術とビジネスの両面が含まれます"},
+        responses,
+        "統合された回答です。" * 40,
+        elapsed=1.5,
+    )
+
+
+def _legacy_dict(result: OrchestratorResult) -> Dict[str, Any]:
+    """以前の process が返していた辞書と同じ形に変換する"""
+    legacy = dict(result)
+    legacy["individual_responses"] = [dict(r) for r in result.individual_responses]
+    return legacy
+
+
+def _bytes_per_item(build: Callable[[], Any], count: int) -> float:
+    """build() で作ったオブジェクトを count 個保持したときの1個あたりのバイト数"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = [build() for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+
+def measure_memory(count: int = 10000) -> Dict[str, float]:
+    """
+    結果オブジェクトと従来の辞書の1件あたりのメモリ使用量を計測する
+    
+    文字列は両方で同じオブジェクトを共有するため、入れ物の大きさだけを比べることになる。
+    
+    Returns:
+        {"slotted": バイト数, "dict": バイト数}
+    """
+    result = _sample_result(0)
+    responses = result.individual_responses
+    
+    def slotted():
+        return OrchestratorResult(
+            result.orchestrator, result.query, result.classification,
+            [AgentResponse(r.agent, r.specialty, r.response) for r in responses],
+            result.final_response, result.elapsed,
+        )
+    
+    return {
+        "slotted": _bytes_per_item(slotted, count),
+        "dict": _bytes_per_item(lambda: _legacy_dict(result), count),
+    }
+
+
+def _best_of(func: Callable[[], Any], runs: int) -> float:
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure_serialization(count: int = 50000, runs: int = 3) -> Dict[str, float]:
+    """
+    count 件の結果をJSONに書き出す時間（秒、runs 回の最小値）を計測する
+    
+    Returns:
+        {"to_json": 配列形式, "to_dict": to_dict() を json.dumps,
+         "dict": 従来の process が返していた辞書を json.dumps（辞書はあらかじめ作っておく）}
+    """
+    results: List[OrchestratorResult] = [_sample_result(i) for i in range(count)]
+    legacy = [_legacy_dict(r) for r in results]
+    options = {"ensure_ascii": False, "separators": (",", ":")}
+    return {
+        "to_json": _best_of(lambda: [r.to_json() for r in results], runs),
+        "to_dict": _best_of(lambda: [json.dumps(r.to_dict(), **options) for r in results], runs),
+        "dict": _best_of(lambda: [json.dumps(d, **options) for d in legacy], runs),
+    }
+
+
+def main():
+    """メモリ使用量とシリアライズ時間を表示する"""
+    memory = measure_memory()
+    print(f"[ResultBenchmark] メモリ: OrchestratorResult {memory['slotted']:.0f}バイト/件、"
+          f"従来の辞書 {memory['dict']:.0f}バイト/件")
+    
+    timings = measure_serialization()
+    print(f"[ResultBenchmark] JSON書き出し（50000件）: to_json() {timings['to_json']:.2f}秒、"
+          f"json.dumps(to_dict()) {timings['to_dict']:.2f}秒、"
+          f"従来の辞書の json.dumps {timings['dict']:.2f}秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
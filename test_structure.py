@@ -153,6 +153,523 @@ def test_main_functions():
     return True
 
 
+def test_deadline_degradation():
+    """Test that a hung sub-agent is cut off and a partial answer is returned"""
+    import time
+    from mock_demo import MockClient, MockResponse
+    from orchestrator_agent import OrchestratorAgent
+    
+    class SlowBusinessCompletions(MockClient.Completions):
+        def create(self, **kwargs):
+            system_prompt = kwargs['messages'][0]['content']
+            if "質問を分類" in system_prompt:
+                return MockResponse('{"type": "both", "reasoning": "test"}')
+            if "ビジネス分析に特化" in system_prompt:
+                time.sleep(2.0)
+            return super().create(**kwargs)
+    
+    client = MockClient()
+    client.chat.completions = SlowBusinessCompletions()
+    orchestrator = OrchestratorAgent(client, "gpt-4-mock", deadline=0.5)
+    
+    started = time.monotonic()
+    result = orchestrator.process("マルチエージェントの技術と収益モデルは？")
+    elapsed = time.monotonic() - started
+    
+    errors = []
+    if elapsed > 1.0:
+        errors.append(f"process took {elapsed:.2f}s despite a 0.5s deadline")
+    if result['agent_status'] != {"TechnicalAgent": "success", "BusinessAgent": "timeout"}:
+        errors.append(f"unexpected agent_status: {result['agent_status']}")
+    if not result['success'] or not result['partial']:
+        errors.append("partial result should be reported as a partial success")
+    
+    # 全てのエージェントが失敗した場合は、エラー内容を統合用のLLMに渡さないこと
+    class FailingAgentsCompletions(MockClient.Completions):
+        def __init__(self):
+            self.synthesis_calls = 0
+        
+        def create(self, **kwargs):
+            system_prompt = kwargs['messages'][0]['content']
+            if "質問を分類" in system_prompt:
+                return MockResponse('{"type": "both", "reasoning": "test"}')
+            if "統合する調整役" in system_prompt:
+                self.synthesis_calls += 1
+                return super().create(**kwargs)
+            raise ConnectionError("503 upstream")
+    
+    failing = MockClient()
+    failing.chat.completions = FailingAgentsCompletions()
+    failed = OrchestratorAgent(failing, "gpt-4-mock").process("マルチエージェントの技術と収益モデルは？")
+    if failing.chat.completions.synthesis_calls != 0:
+        errors.append("synthesis LLM was called although every agent failed")
+    if failed['success'] or "503 upstream" not in failed['final_response']:
+        errors.append("failed agents' errors should be returned as the final response")
+    
+    if errors:
+        for error in errors:
+            print(f"✗ {error}")
+        return False
+    
+    print("✓ Hung agents are cut off at the deadline")
+    return True
+
+
+def test_deadline_disables_sdk_retries():
+    """Test that a hanging call is not retried past the deadline"""
+    import time
+    from mock_demo import MockResponse
+    from orchestrator_agent import OrchestratorAgent
+    
+    class RetryingClient:
+        """Mimics the SDK: each of the 1 + max_retries attempts waits for the full timeout"""
+        
+        class Completions:
+            def __init__(self, client):
+                self.client = client
+            
+            def create(self, **kwargs):
+                system_prompt = kwargs['messages'][0]['content']
+                if "質問を分類" in system_prompt:
+                    return MockResponse('{"type": "both", "reasoning": "test"}')
+                if "統合する調整役" not in system_prompt:
+                    return MockResponse("回答です。")
+                for _ in range(1 + self.client.max_retries):
+                    time.sleep(kwargs.get('timeout', 5.0))
+                raise TimeoutError("Request timed out.")
+        
+        class Chat:
+            def __init__(self, client):
+                self.completions = RetryingClient.Completions(client)
+        
+        def __init__(self, max_retries=2):
+            self.max_retries = max_retries
+            self.chat = RetryingClient.Chat(self)
+        
+        def with_options(self, max_retries):
+            return RetryingClient(max_retries)
+    
+    client = RetryingClient()
+    orchestrator = OrchestratorAgent(client, "gpt-4-mock", deadline=0.5)
+    
+    started = time.monotonic()
+    result = orchestrator.process("技術とビジネスの両面から教えてください。")
+    elapsed = time.monotonic() - started
+    
+    errors = []
+    if elapsed > 0.8:
+        errors.append(f"process took {elapsed:.2f}s despite a 0.5s deadline (SDK retries not disabled)")
+    if not result['success']:
+        errors.append("agents answered, so the result should still succeed via the fallback")
+    
+    # SDKの自動リトライの代わりに、持ち時間内であれば429は再試行すること
+    from mock_demo import MockClient
+    
+    class RateLimitError(Exception):
+        status_code = 429
+    
+    class FlakyCompletions(MockClient.Completions):
+        def __init__(self):
+            self.failures = 0
+        
+        def create(self, **kwargs):
+            if "技術的な質問に特化" in kwargs['messages'][0]['content'] and self.failures == 0:
+                self.failures += 1
+                raise RateLimitError("Rate limit reached")
+            return super().create(**kwargs)
+    
+    flaky = MockClient()
+    flaky.chat.completions = FlakyCompletions()
+    retried = OrchestratorAgent(flaky, "gpt-4-mock", deadline=5.0).process("Pythonの実装方法を教えてください。")
+    if flaky.chat.completions.failures != 1 or retried['agent_status'] != {"TechnicalAgent": "success"}:
+        errors.append(f"transient 429 was not retried within the deadline: {retried['agent_status']}")
+    
+    if errors:
+        for error in errors:
+            print(f"✗ {error}")
+        return False
+    
+    print("✓ SDK retries are disabled when a deadline applies")
+    return True
+
+
+class _OutageClient:
+    """Client whose every call fails, as during an API outage (module level so worker processes can build it)"""
+    
+    class Completions:
+        def create(self, **kwargs):
+            raise ConnectionError("503 upstream")
+    
+    class Chat:
+        def __init__(self):
+            self.completions = _OutageClient.Completions()
+    
+    def __init__(self):
+        self.chat = _OutageClient.Chat()
+
+
+def test_batch_runner():
+    """Test that the sharded batch runner merges results in input order and resumes"""
+    import json
+    import os
+    import tempfile
+    from batch_runner import RateLimiter, plan_shards, run_batch
+    from mock_demo import MockClient
+    
+    queries = [f"質問{i}: Pythonの実装について" for i in range(7)]
+    errors = []
+    
+    # 持ち時間内に枠が回ってこない呼び出しは、枠を予約せずに諦めること
+    limiter = RateLimiter(10)
+    limiter.acquire()
+    next_slot = limiter._next_slot.value
+    if limiter.acquire(timeout=0.01) or limiter._next_slot.value != next_slot:
+        errors.append("a call that cannot get a slot within its timeout should not reserve one")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "input.jsonl")
+        output_path = os.path.join(tmp, "output.jsonl")
+        work_dir = os.path.join(tmp, "shards")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for i, query in enumerate(queries):
+                f.write(json.dumps({"id": i, "query": query}, ensure_ascii=False) + "\n")
+            f.write('{"id": 7, "q": "queryキーがない行"}\n')
+            f.write('{"id": 8, "query": 壊れたJSON\n')
+        
+        # シャードは行の先頭でそろえた連続するバイト範囲になり、先頭行の行番号を持つこと
+        with open(input_path, "rb") as f:
+            data = f.read()
+        for workers in (3, 20):
+            spans = plan_shards(input_path, workers)
+            if [span[0] for span in spans[1:]] != [span[1] for span in spans[:-1]] or spans[-1][1] != len(data):
+                errors.append(f"shards do not cover the input contiguously: {spans}")
+            if any(start and data[start - 1:start] != b"\n" or index != data[:start].count(b"\n")
+                   for start, _, index in spans):
+                errors.append(f"shards do not start at line boundaries: {spans}")
+        
+        run_batch(input_path, output_path, work_dir, workers=3,
+                  client_factory=MockClient, deployment_name="gpt-4-mock", rate=1000)
+        
+        # 1シャードの最終行が壊れた状態から再開できること
+        with open(os.path.join(work_dir, "shard-00001.jsonl"), "a", encoding="utf-8") as f:
+            f.write('{"index": 99, "trunc')
+        summary = run_batch(input_path, output_path, work_dir, workers=3,
+                            client_factory=MockClient, deployment_name="gpt-4-mock")
+        
+        with open(output_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        
+        if summary['processed'] != len(queries) + 2 or summary['failed'] != 2:
+            errors.append(f"expected {len(queries)} results and 2 errors, got {summary}")
+        if [row['index'] for row in rows] != list(range(len(queries) + 2)):
+            errors.append("merged results are not in input order")
+        if any(row['result']['query'] != queries[row['id']] for row in rows[:len(queries)]):
+            errors.append("results do not match their queries")
+        if rows[7].get('id') != 7 or 'error' not in rows[7] or 'error' not in rows[8]:
+            errors.append("bad input lines should produce error rows instead of stopping the shard")
+        
+        # API障害で失敗した行は完了扱いにせず、再実行時に処理し直すこと
+        outage_dir = os.path.join(tmp, "outage")
+        outage = run_batch(input_path, output_path, outage_dir, workers=2,
+                           client_factory=_OutageClient, deployment_name="gpt-4-mock")
+        if outage['failed'] != len(queries) + 2:
+            errors.append(f"failed results should be counted as failures, got {outage}")
+        recovered = run_batch(input_path, output_path, outage_dir, workers=2,
+                              client_factory=MockClient, deployment_name="gpt-4-mock")
+        with open(output_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        if recovered['failed'] != 2 or [row['status'] for row in rows[:len(queries)]] != ["success"] * len(queries):
+            errors.append(f"failed results were not retried on the next run: {recovered}")
+        if [row['index'] for row in rows] != list(range(len(queries) + 2)):
+            errors.append("retried results are not merged in input order")
+    
+    if errors:
+        for error in errors:
+            print(f"✗ {error}")
+        return False
+    
+    print("✓ Batch runner merges shards in order and resumes from checkpoints")
+    return True
+
+
+def test_record_replay():
+    """Test that recorded orchestrator traffic replays identically without the original client"""
+    import os
+    import tempfile
+    import time
+    from mock_demo import MockClient
+    from orchestrator_agent import OrchestratorAgent
+    from record_replay import RecordedAPIError, RecordingClient, ReplayClient
+    
+    query = "AIエージェントのビジネス活用について教えてください。"
+    errors = []
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cassette.json.gz")
+        with RecordingClient(MockClient(), path) as recorder:
+            recorded = OrchestratorAgent(recorder, "gpt-4-mock").process(query)
+        
+        replayer = ReplayClient(path, latency_scale=0)
+        replayed = OrchestratorAgent(replayer, "gpt-4-mock").process(query)
+        
+        if replayed['final_response'] != recorded['final_response']:
+            errors.append("replayed final response differs from the recording")
+        if replayed['agent_status'] != recorded['agent_status']:
+            errors.append("replayed agent status differs from the recording")
+        
+        try:
+            replayer.chat.completions.create(model="gpt-4-mock", messages=[])
+            errors.append("unrecorded request should raise KeyError")
+        except KeyError:
+            pass
+        
+        # 失敗した呼び出しも、同じレイテンシの後に同じ種類のエラーとして再生されること
+        class RateLimitError(Exception):
+            status_code = 429
+        
+        class FailingCompletions:
+            def create(self, **kwargs):
+                time.sleep(0.05)
+                if kwargs['model'] == "rate-limited":
+                    raise RateLimitError("Rate limit reached")
+                raise TimeoutError("Request timed out.")
+        
+        failing = MockClient()
+        failing.chat.completions = FailingCompletions()
+        error_path = os.path.join(tmp, "errors.json.gz")
+        with RecordingClient(failing, error_path) as recorder:
+            for model in ("rate-limited", "timeout"):
+                try:
+                    recorder.chat.completions.create(model=model, messages=[])
+                except Exception:
+                    pass
+        
+        # JSONにできない引数や想定外の応答でも、記録の失敗で成功した呼び出しを壊さないこと
+        class Answer:
+            """Stands in for a response_format model class"""
+        
+        with RecordingClient(MockClient(), error_path + ".format") as recorder:
+            recorder.chat.completions.create(model="format", messages=[], response_format=Answer)
+        if ReplayClient(error_path + ".format", latency_scale=0).chat.completions.create(
+                model="format", messages=[], response_format=Answer).choices[0].message.content is None:
+            errors.append("call with a non-JSON argument was not replayed")
+        
+        class StreamingCompletions:
+            def create(self, **kwargs):
+                return iter(())
+        
+        streaming = MockClient()
+        streaming.chat.completions = StreamingCompletions()
+        try:
+            RecordingClient(streaming, error_path + ".stream").chat.completions.create(model="stream", messages=[])
+        except Exception as e:
+            errors.append(f"recording failure reached the caller: {e!r}")
+        
+        error_replayer = ReplayClient(error_path)
+        started = time.monotonic()
+        try:
+            error_replayer.chat.completions.create(model="rate-limited", messages=[])
+            errors.append("recorded API error was not replayed")
+        except RecordedAPIError as e:
+            if e.error_type != "RateLimitError" or e.status_code != 429:
+                errors.append(f"replayed error lost its type or status: {e!r}")
+        if time.monotonic() - started < 0.04:
+            errors.append("replayed error did not reproduce the recorded latency")
+        try:
+            error_replayer.chat.completions.create(model="timeout", messages=[])
+            errors.append("recorded timeout was not replayed")
+        except TimeoutError:
+            pass
+    
+    if errors:
+        for error in errors:
+            print(f"✗ {error}")
+        return False
+    
+    print("✓ Recorded traffic replays deterministically")
+    return True
+
+
+def test_compact_result():
+    """Test that process results are slotted and still readable like the old dicts"""
+    import json
+    from agent_result import OrchestratorResult
+    from mock_demo import MockClient
+    from orchestrator_agent import OrchestratorAgent
+    
+    result = OrchestratorAgent(MockClient(), "gpt-4-mock").process("Pythonの実装方法を教えてください。")
+    errors = []
+    
+    if hasattr(result, '__dict__') or hasattr(result.individual_responses[0], '__dict__'):
+        errors.append("result objects should not carry a per-instance __dict__")
+    if result['agents_used'] != ["TechnicalAgent"] or not result['success']:
+        errors.append("dict-style access does not match the old result keys")
+    if result['individual_responses'][0].get('error') is not None:
+        errors.append("successful responses should not expose an error key")
+    
+    restored = OrchestratorResult.from_json(result.to_json())
+    if restored.to_dict() != result.to_dict():
+        errors.append("JSON round trip does not restore the result")
+    if OrchestratorResult.from_dict(json.loads(json.dumps(result.to_dict()))).to_dict() != result.to_dict():
+        errors.append("dict round trip does not restore the result")
+    
+    # 時間は環境で揺れるため、ここではメモリ使用量だけを確認する（python result_benchmark.py で両方を表示する）
+    from result_benchmark import measure_memory
+    memory = measure_memory(1000)
+    if memory['slotted'] >= memory['dict']:
+        errors.append(f"slotted results should use less memory than dicts: {memory}")
+    
+    if errors:
+        for error in errors:
+            print(f"✗ {error}")
+        return False
+    
+    print("✓ Results are compact and dict-compatible")
+    return True
+
+
+def test_response_compression():
+    """Test that synthesis input is deduplicated and capped without dropping unique points"""
+    from response_compression import compress_responses, estimate_tokens, split_sentences
+    
+    shared = "AIエージェントは複数の専門家が協調して動作します。"
+    responses = [
+        {"response": shared + "技術的にはオーケストレーターパターンが重要です。\n- 各エージェントをクラスとして実装します。"},
+        {"response": shared + "収益モデルとしてはSaaS型のサブスクリプションが有効です。" * 2 + "市場浸透を優先します。" * 20},
+    ]
+    contents, stats = compress_responses(responses, 80, "AIエージェントの技術と収益")
+    errors = []
+    
+    if shared in contents[1]:
+        errors.append("sentence shared by both agents was not deduplicated")
+    if contents[1].count("SaaS型") != 1:
+        errors.append("repeated sentence within one agent was not deduplicated")
+    if any(estimate_tokens(content) > 80 for content in contents):
+        errors.append("compressed answer exceeds the per-agent token budget")
+    if contents[0] != responses[0]['response']:
+        errors.append("answer within budget and without duplicates should be kept as is")
+    if stats['tokens_saved'] != stats['tokens_before'] - stats['tokens_after'] or stats['tokens_saved'] <= 0:
+        errors.append(f"unexpected compression stats: {stats}")
+    
+    # 予算内の番号付きリストは番号ごとそのまま残ること
+    steps = {"response": "手順:\n1. Pythonをインストールします\n2. 仮想環境を作成します\n3. pipで依存関係を入れます"}
+    other = {"response": "Dr. Smith agrees. 収益化はSaaS型が有効です。"}
+    if split_sentences(steps['response'])[1] != "1. Pythonをインストールします":
+        errors.append("list markers should stay attached to their item")
+    if split_sentences(other['response'])[0] != "Dr. Smith agrees.":
+        errors.append("abbreviations should not end a sentence")
+    list_contents, list_stats = compress_responses([steps, other], 300)
+    if list_contents != [steps['response'], other['response']] or list_stats['sentences_removed'] != 0:
+        errors.append(f"numbered list within budget was rewritten: {list_contents[0]!r}, {list_stats}")
+    
+    if errors:
+        for error in errors:
+            print(f"✗ {error}")
+        return False
+    
+    print(f"✓ Synthesis input compressed by {stats['tokens_saved']} tokens in {stats['elapsed_ms']:.2f}ms")
+    return True
+
+
+def test_token_provider():
+    """Test that Entra ID tokens are cached and refreshed in the background"""
+    import time
+    from collections import namedtuple
+    from azure_credentials import CachedTokenProvider, get_shared_token_provider
+    
+    AccessToken = namedtuple("AccessToken", ["token", "expires_on"])
+    
+    class FakeClock:
+        def __init__(self):
+            self.now = 1000.0
+        
+        def __call__(self):
+            return self.now
+    
+    clock = FakeClock()
+    
+    class FakeCredential:
+        def __init__(self):
+            self.calls = 0
+        
+        def get_token(self, *scopes):
+            self.calls += 1
+            return AccessToken(f"token-{self.calls}", clock.now + 3600)
+    
+    def wait_until(condition, timeout=5.0):
+        # 更新スレッドの反映を待つ（偽の時計で期限を進めるため、実時間の差には依存しない）
+        limit = time.monotonic() + timeout
+        while not condition() and time.monotonic() < limit:
+            time.sleep(0.005)
+        return condition()
+    
+    credential = FakeCredential()
+    provider = CachedTokenProvider(credential, refresh_margin=300, poll_interval=0.01, clock=clock).start()
+    errors = []
+    
+    try:
+        tokens = {provider() for _ in range(100)}
+        if tokens != {"token-1"} or credential.calls != 1:
+            errors.append("requests should be served from the cached token")
+        
+        clock.now += 3000
+        time.sleep(0.05)
+        if credential.calls != 1:
+            errors.append("token was refreshed before it was due")
+        
+        clock.now += 400
+        if not wait_until(lambda: provider._token == "token-2"):
+            errors.append("token was not refreshed in the background before expiry")
+        
+        if provider() != "token-2" or credential.calls != 2:
+            errors.append("request path should get the refreshed token without fetching one itself")
+    finally:
+        provider.stop()
+    
+    # 共有プロバイダーはスコープごとに1つで、別のクレデンシャルでは黙って使い回さないこと
+    scope = "https://example.invalid/.default"
+    factory = FakeCredential
+    shared = get_shared_token_provider(factory, scope)
+    try:
+        if get_shared_token_provider(factory, scope) is not shared:
+            errors.append("same scope and credential should share one provider")
+        try:
+            get_shared_token_provider(lambda: FakeCredential(), scope)
+            errors.append("a different credential for the same scope should be rejected")
+        except ValueError:
+            pass
+        other = get_shared_token_provider(factory, scope + "/other")
+        if other is shared:
+            errors.append("different scopes should not share a provider")
+        other.stop()
+    finally:
+        shared.stop()
+    
+    if errors:
+        for error in errors:
+            print(f"✗ {error}")
+        return False
+    
+    print("✓ Tokens are cached and refreshed off the request path")
+    return True
+
+
+def test_import_time():
+    """Test that entry points import without pulling in heavy dependencies"""
+    from import_benchmark import check_import_budgets
+    
+    # 時間の予算はCI環境で揺れるため、ここでは確認しない（python import_benchmark.py で確認する）
+    errors = check_import_budgets(runs=1, enforce_budgets=False)
+    
+    if errors:
+        for error in errors:
+            print(f"✗ {error}")
+        return False
+    
+    print("✓ Entry points import without heavy dependencies")
+    return True
+
+
 def main():
     """Run all tests"""
     print("=" * 60)
@@ -166,6 +683,14 @@ def main():
         ("Method Signatures", test_method_signatures),
         ("Agent Attributes", test_agent_attributes),
         ("Main Functions", test_main_functions),
+        ("Deadline Degradation", test_deadline_degradation),
+        ("Deadline Retries", test_deadline_disables_sdk_retries),
+        ("Batch Runner", test_batch_runner),
+        ("Record/Replay", test_record_replay),
+        ("Compact Result", test_compact_result),
+        ("Response Compression", test_response_compression),
+        ("Token Provider", test_token_provider),
+        ("Import Time", test_import_time),
     ]
     
     results = []